@@ -13,161 +13,953 @@ import time
 import sys
 import os
 import psutil
+import json
+import re
 import numpy as np
-from ast import literal_eval
+from functools import lru_cache
+from math import comb
+from numba import njit, prange
+from numba.extending import overload
+from numba.typed import List
+
+# De Bruijn multiplier and lookup table for finding the index of a single set bit
+DEBRUIJN_64 = np.uint64(0x03F79D71B4CB0A89)
+DEBRUIJN_INDEX = np.zeros(64, dtype=np.int64)
+for _i in range(64):
+    DEBRUIJN_INDEX[(((1 << _i) * 0x03F79D71B4CB0A89) & 0xFFFFFFFFFFFFFFFF) >> 58] = _i
+
+# Rows/columns with more domain values than this are not generated until they are needed
+MAX_DOMAIN_VALUES = 1 << 14
+
+
+@njit(cache=True, boundscheck=False)
+def _enumerate_lines(out, nums, gaps, starts, prefix, run_mask, slack, count, W):
+    """Generates domain values for nums into out.
+
+    Every domain value is one way of sharing the slack (the empty cells
+    that are not needed to separate the cell groups) between the gaps in
+    front of each group, so the gaps are enumerated in lexicographic order.
+    Moving on to the next way only moves the groups from the changed gap
+    onwards, so only those groups are ORed back onto the kept prefix.
+
+    Args:
+        out: an array of shape (words, at least count) to write the domain values into.
+        nums: an array of all cell groups.
+        gaps: a zeroed scratch array with one int64 per cell group.
+        starts: a scratch array with one int64 per cell group.
+        prefix: a zeroed scratch array of shape (cell groups + 1, words).
+        run_mask: a table where run_mask[k][i] is the bitmask of k filled cells starting at index i.
+        slack: the amount of empty cells that can move between the cell groups.
+        count: the amount of domain values nums has.
+        W: the number of uint64 words per domain value.
+    """
+    m = len(nums)
+    if m == 0:
+        return
+
+    total, first = 0, 0
+    for n_out in range(count):
+        pos = 0 if first == 0 else starts[first - 1] + nums[first - 1] + 1
+        for idx in range(first, m):
+            pos += gaps[idx]
+            starts[idx] = pos
+            for w in range(W):
+                prefix[idx + 1, w] = prefix[idx, w] | run_mask[nums[idx], pos, w]
+            pos += nums[idx] + 1
+        for w in range(W):
+            out[w, n_out] = prefix[m, w]
+
+        # Move on to the next way of sharing the slack between the gaps
+        if total < slack:
+            gaps[m - 1] += 1
+            total += 1
+            first = m - 1
+        else:
+            idx = m - 1
+            while idx > 0 and gaps[idx] == 0:
+                idx -= 1
+            total -= gaps[idx] - 1
+            gaps[idx] = 0
+            if idx > 0:
+                gaps[idx - 1] += 1
+                first = idx - 1
+
+
+@njit(parallel=True, cache=True, boundscheck=False)
+def _build_all_domains(clue_offsets, clue_values, value_offsets, slacks, counts, run_mask, W):
+    """Generates the domains of many rows/columns at once.
+
+    The scratch space of every row/column is allocated once up front and
+    laid out like clue_values, so each parallel iteration gets its own slice.
+    The domains are laid out the same way, each taking words times its
+    amount of domain values from one flat buffer.
+
+    Args:
+        clue_offsets: where the cell groups of each row/column start in clue_values.
+        clue_values: the cell groups of every row/column, one after another.
+        value_offsets: where the domain values of each row/column start, counted in domain values.
+        slacks: the slack of each row/column.
+        counts: the amount of domain values of each row/column.
+        run_mask: a table where run_mask[k][i] is the bitmask of k filled cells starting at index i.
+        W: the number of uint64 words per domain value.
+
+    Returns:
+        A flat array of every domain, one after another.
+    """
+    packed = np.zeros(W * value_offsets[-1], dtype=np.uint64)
+    gaps = np.zeros(len(clue_values), dtype=np.int64)
+    starts = np.zeros(len(clue_values), dtype=np.int64)
+    prefix = np.zeros((len(clue_values) + len(counts), W), dtype=np.uint64)
+    for i in prange(len(counts)):
+        lo, hi = clue_offsets[i], clue_offsets[i + 1]
+        out = packed[W * value_offsets[i]:W * value_offsets[i + 1]].reshape((W, counts[i]))
+        _enumerate_lines(out, clue_values[lo:hi], gaps[lo:hi], starts[lo:hi],
+                         prefix[lo + i:hi + i + 1], run_mask, slacks[i], counts[i], W)
+    return packed
+
+
+@njit(cache=True, boundscheck=False)
+def _split_domains(packed, value_offsets, W):
+    """Returns a list of views of the (words, domain values) domains in packed.
+
+    The list is built here so that Python never has to compile the
+    methods of a typed List itself.
+
+    Args:
+        packed: the flat array returned by _build_all_domains.
+        value_offsets: where the domain values of each row/column start, counted in domain values.
+        W: the number of uint64 words per domain value.
+    """
+    domains = List()
+    for i in range(len(value_offsets) - 1):
+        lo, hi = value_offsets[i], value_offsets[i + 1]
+        domains.append(packed[W * lo:W * hi].reshape((W, hi - lo)))
+    return domains
+
+
+@njit(cache=True, boundscheck=False)
+def _drop_words(domains):
+    """Returns a list of views of the only word of each domain in domains."""
+    words = List()
+    for domain in domains:
+        words.append(domain[0])
+    return words
+
+
+@njit(cache=True, boundscheck=False)
+def _get_domain(domains, i):
+    """Returns the domain at index i of a list of domains."""
+    return domains[i]
+
+
+@njit(cache=True, boundscheck=False)
+def _set_domain(domains, i, domain):
+    """Replaces the domain at index i of a list of domains."""
+    domains[i] = domain
+
+
+@njit(cache=True, boundscheck=False)
+def _build_run_mask(N, W):
+    """Builds the run mask table for a puzzle size.
+
+    Each run is the run one cell shorter with its last cell added.
+
+    Args:
+        N: the number of rows/columns.
+        W: the number of uint64 words per domain value.
+
+    Returns:
+        A table where run_mask[k][i] is the bitmask of k filled cells starting at index i.
+    """
+    run_mask = np.zeros((N + 1, N, W), dtype=np.uint64)
+    for k in range(1, N + 1):
+        for i in range(N - k + 1):
+            last = i + k - 1
+            run_mask[k, i] = run_mask[k - 1, i]
+            run_mask[k, i, last >> 6] |= np.uint64(1) << np.uint64(last & 63)
+    return run_mask
+
+
+@lru_cache(maxsize=None)
+def run_mask_table(size):
+    """Returns the run mask table for a puzzle size, building it only the first time.
+
+    The table is shared by every solver of that size, so it is made read-only.
+    """
+    table = _build_run_mask(size, (size + 63) // 64)
+    table.flags.writeable = False
+    return table
+
+
+@njit(cache=True, boundscheck=False)
+def _count_known_lines(nums, filled, empty, limit):
+    """Counts the domain values for nums that agree with the known cells of a row/column.
+
+    Args:
+        nums: an array of all cell groups.
+        filled: a boolean array of the cells known to be filled.
+        empty: a boolean array of the cells known to be empty.
+        limit: the count at which counting stops, at most the largest int64.
+
+    Returns:
+        A table where ways[idx][pos] is the amount of ways (up to limit) to
+        place nums[idx:] in the cells from pos onwards.
+    """
+    m, N = len(nums), len(filled)
+    empty_before = np.zeros(N + 1, dtype=np.int64)
+    for i in range(N):
+        empty_before[i + 1] = empty_before[i] + empty[i]
+
+    ways = np.zeros((m + 1, N + 1), dtype=np.int64)
+    ways[m, N] = 1
+    for pos in range(N - 1, -1, -1):
+        ways[m, pos] = 0 if filled[pos] else ways[m, pos + 1]
+    for idx in range(m - 1, -1, -1):
+        k = nums[idx]
+        for pos in range(N - 1, -1, -1):
+            count = 0 if filled[pos] else ways[idx, pos + 1]
+            end = pos + k
+            if end <= N and empty_before[end] == empty_before[pos] and (end == N or not filled[end]):
+                # Saturate before adding so that two capped counts cannot overflow
+                placed = ways[idx + 1, min(end + 1, N)]
+                count = min(count, limit - placed) + placed
+            ways[idx, pos] = count
+    return ways
+
+
+@njit(cache=True, boundscheck=False)
+def _enumerate_known_lines(out, nums, run_mask, filled, empty, ways, W):
+    """Generates the domain values for nums that agree with the known cells of a row/column.
+
+    Only placements that ways says can still be completed are followed,
+    so every branch of the walk ends in a domain value.
+
+    Args:
+        out: a zeroed array of shape (words, at least ways[0][0]) to write the domain values into.
+        nums: an array of all cell groups.
+        run_mask: a table where run_mask[k][i] is the bitmask of k filled cells starting at index i.
+        filled: a boolean array of the cells known to be filled.
+        empty: a boolean array of the cells known to be empty.
+        ways: the table returned by _count_known_lines.
+        W: the number of uint64 words per domain value.
+
+    Returns:
+        The amount of domain values written to out.
+    """
+    m, N = len(nums), len(filled)
+    if m == 0:
+        return ways[0, 0]
+
+    empty_before = np.zeros(N + 1, dtype=np.int64)
+    for i in range(N):
+        empty_before[i + 1] = empty_before[i] + empty[i]
+
+    # lo[idx] is the first cell after the previous group, start[idx] the next start to try
+    cur = np.zeros((m + 1, W), dtype=np.uint64)
+    lo = np.zeros(m, dtype=np.int64)
+    start = np.zeros(m, dtype=np.int64)
+    n_out, idx = 0, 0
+    while idx >= 0:
+        k, t, found = nums[idx], start[idx], False
+        while t + k <= N:
+            if t > lo[idx] and filled[t - 1]:
+                break
+            end = t + k
+            if empty_before[end] == empty_before[t] and (end == N or not filled[end]) and \
+                    ways[idx + 1, min(end + 1, N)] > 0:
+                found = True
+                break
+            t += 1
+        if not found:
+            idx -= 1
+            if idx >= 0:
+                start[idx] += 1
+            continue
+
+        start[idx] = t
+        for w in range(W):
+            cur[idx + 1, w] = cur[idx, w] | run_mask[k, t, w]
+        if idx == m - 1:
+            for w in range(W):
+                out[w, n_out] = cur[m, w]
+            n_out += 1
+            start[idx] += 1
+        else:
+            lo[idx + 1] = start[idx + 1] = t + k + 1
+            idx += 1
+    return n_out
+
+
+@njit(cache=True, boundscheck=False)
+def _find_forced_cells(nums, filled, empty, ways):
+    """Finds the cells that agree in every domain value for nums of a row/column.
+
+    A forward pass marks where each cell group can start after the groups
+    before it are placed, and ways says whether the groups after it can
+    still be placed, so a cell can be filled or empty only if some
+    placement that passes through it can be completed.
+
+    Args:
+        nums: an array of all cell groups.
+        filled: a boolean array of the cells known to be filled.
+        empty: a boolean array of the cells known to be empty.
+        ways: the table returned by _count_known_lines, with ways[0][0] > 0.
+
+    Returns:
+        A boolean array of the cells filled in every domain value and a
+        boolean array of the cells empty in every domain value.
+    """
+    m, N = len(nums), len(filled)
+    empty_before = np.zeros(N + 1, dtype=np.int64)
+    for i in range(N):
+        empty_before[i + 1] = empty_before[i] + empty[i]
+
+    # reached[idx][pos] is whether nums[:idx] fit in the cells before pos
+    reached = np.zeros((m + 1, N + 1), dtype=np.bool_)
+    reached[0, 0] = True
+    can_fill = np.zeros(N, dtype=np.bool_)
+    can_empty = np.zeros(N, dtype=np.bool_)
+    for pos in range(N):
+        for idx in range(m + 1):
+            if not reached[idx, pos]:
+                continue
+            if not filled[pos]:
+                reached[idx, pos + 1] = True
+                if ways[idx, pos + 1] > 0:
+                    can_empty[pos] = True
+            if idx == m:
+                continue
+            end = pos + nums[idx]
+            if end <= N and empty_before[end] == empty_before[pos] and (end == N or not filled[end]):
+                reached[idx + 1, min(end + 1, N)] = True
+                if ways[idx + 1, min(end + 1, N)] > 0:
+                    can_fill[pos:end] = True
+                    if end < N:
+                        can_empty[end] = True
+    return ~can_empty, ~can_fill
+
+
+@njit(cache=True, boundscheck=False)
+def _remove_idx(buf, length, j):
+    """Removes a live domain value by swapping it with the last live domain value.
+
+    Args:
+        buf: the packed domain values.
+        length: the amount of live domain values in buf.
+        j: the index of the domain value to remove.
+
+    Returns:
+        The new amount of live domain values in buf.
+    """
+    length -= 1
+    for w in range(buf.shape[0]):
+        buf[w, j] = buf[w, length]
+    return length
+
+
+@njit(cache=True, boundscheck=False)
+def _mark_cell(board, index, i, is_rows):
+    """Marks a cell in a board bitmap.
+
+    Args:
+        board: a (rows, words) bitmap of cells.
+        index: the index of the domain that was searched.
+        i: the index of the cell within that domain.
+        is_rows: whether the searched domain is a row or a column.
+
+    Returns:
+        Whether the cell was already marked.
+    """
+    r, c = (index, i) if is_rows else (i, index)
+    mask = np.uint64(1) << np.uint64(c & 63)
+    marked = (board[r, c >> 6] & mask) != 0
+    board[r, c >> 6] |= mask
+    return marked
+
+
+@njit(cache=True, boundscheck=False)
+def _push_dirty(dirty, i, queue, state, line):
+    """Marks a domain as dirty and queues it if it is not queued already.
+
+    Args:
+        dirty: a boolean array of queued domains.
+        i: the index of the domain within dirty.
+        queue: a circular buffer of queued lines, where rows are 0 to N - 1 and columns N to 2N - 1.
+        state: an array of the head of queue and the amount of queued lines.
+        line: the line number of the domain in queue.
+    """
+    if not dirty[i]:
+        dirty[i] = True
+        queue[(state[0] + state[1]) % len(queue)] = line
+        state[1] += 1
+
+
+@njit(cache=True, boundscheck=False)
+def _pop_line(queue, state):
+    """Removes and returns the line at the head of queue."""
+    line = queue[state[0]]
+    state[0] = (state[0] + 1) % len(queue)
+    state[1] -= 1
+    return line
+
+
+@njit(cache=True, boundscheck=False)
+def _reduce_neighbor_domains(domain, domains_b, lengths_b, dirty_b, index, known_intersects,
+                             known_false, is_rows, queue, state, N):
+    """Reduces the domains neighboring a known domain.
+
+    Every neighboring domain that crosses an empty cell of the known domain
+    drops its domain values that fill that cell in one pass of _reduce_domain.
+
+    Args:
+        domain: the packed domain values of the known domain.
+        domains_b: a list of the packed domains that neighbor the known domain.
+        lengths_b: the amount of live domain values in each domain of domains_b.
+        dirty_b: a boolean array of queued domains in domains_b.
+        index: the index of the known domain from the list of domains that it came from.
+        known_intersects: the bitmap of known intersections of the known domain.
+        known_false: the board bitmap of cells known to be empty.
+        is_rows: whether the known domain is a row or a column.
+        queue: the queue of lines to search.
+        state: the head and size of queue.
+        N: the number of rows/columns.
+    """
+    known_value = domain[:, 0]
+    for i in range(N):
+        if (known_value[i >> 6] >> np.uint64(i & 63)) & np.uint64(1) or \
+                _mark_cell(known_false, index, i, is_rows) or lengths_b[i] <= 1 or \
+                (known_intersects[i >> 6] >> np.uint64(i & 63)) & np.uint64(1):
+            continue
+        length = _reduce_domain(domains_b[i], lengths_b[i], index, 0)
+        if length != lengths_b[i]:
+            lengths_b[i] = length
+            _push_dirty(dirty_b, i, queue, state, i + N if is_rows else i)
+
+
+@njit(cache=True, boundscheck=False)
+def _reduce_domain(domain, length, index, value):
+    """Reduces a domain given a known index and value within that domain.
+
+    Each live domain value is tested against value with a single masked
+    compare, and mismatches are swapped with the last live domain value and dropped.
+
+    Args:
+        domain: the packed domain values.
+        length: the amount of live domain values in domain.
+        index: the index of the known value.
+        value: the value of the known index.
+
+    Returns:
+        The new amount of live domain values in domain.
+    """
+    if length == 1:
+        return length
+    word = index >> 6
+    mask = np.uint64(1) << np.uint64(index & 63)
+    want = mask if value else np.uint64(0)
+    for j in range(length - 1, -1, -1):
+        if (domain[word, j] & mask) != want:
+            length = _remove_idx(domain, length, j)
+    return length
+
+
+@njit(cache=True, boundscheck=False)
+def _get_domain_intersects(domain, length, known_intersects, full_mask, N, W):
+    """Returns the intersections/known values within a domain.
+
+    Cells in known_intersects are masked out before the domain values are
+    reduced, so only the set bits of the remaining words are visited.
+
+    Args:
+        domain: the packed domain values.
+        length: the amount of live domain values in domain.
+        known_intersects: the bitmap of known intersections of domain.
+        full_mask: a bitmask with a bit set for every cell in a row/column.
+        N: the number of rows/columns.
+        W: the number of uint64 words per domain value.
+
+    Returns:
+        An array of the indexes of the intersections and an array of their values.
+    """
+    all_true = full_mask & ~known_intersects
+    all_false = full_mask & ~known_intersects
+    for w in range(W):
+        for j in range(length):
+            all_true[w] &= domain[w, j]
+            all_false[w] &= ~domain[w, j]
+    cols = np.empty(N, dtype=np.int64)
+    values = np.empty(N, dtype=np.uint64)
+    count = 0
+    for found, value in ((all_true, 1), (all_false, 0)):
+        for w in range(W):
+            word = found[w]
+            while word:
+                bit = word & (~word + np.uint64(1))
+                cols[count] = 64 * w + DEBRUIJN_INDEX[(bit * DEBRUIJN_64) >> np.uint64(58)]
+                values[count] = value
+                count += 1
+                word ^= bit
+    return cols[:count], values[:count]
+
+
+@njit(cache=True, boundscheck=False)
+def _remove_idx_64(buf, length, j):
+    """Single-word version of _remove_idx for rows/columns of at most 64 cells.
+
+    Args:
+        buf: the domain values, one uint64 each.
+        length: the amount of live domain values in buf.
+        j: the index of the domain value to remove.
+
+    Returns:
+        The new amount of live domain values in buf.
+    """
+    length -= 1
+    buf[j] = buf[length]
+    return length
+
+
+@njit(cache=True, boundscheck=False)
+def _mark_cell_64(board, index, i, is_rows):
+    """Single-word version of _mark_cell for rows/columns of at most 64 cells.
+
+    Args:
+        board: a bitmap of cells with one uint64 per row.
+        index: the index of the domain that was searched.
+        i: the index of the cell within that domain.
+        is_rows: whether the searched domain is a row or a column.
+
+    Returns:
+        Whether the cell was already marked.
+    """
+    r, c = (index, i) if is_rows else (i, index)
+    mask = np.uint64(1) << np.uint64(c)
+    marked = (board[r] & mask) != 0
+    board[r] |= mask
+    return marked
+
+
+@njit(cache=True, boundscheck=False)
+def _reduce_neighbor_domains_64(domain, domains_b, lengths_b, dirty_b, index, known_intersects,
+                                known_false, is_rows, queue, state, N):
+    """Single-word version of _reduce_neighbor_domains for rows/columns of at most 64 cells.
+
+    Args:
+        domain: the domain values of the known domain, one uint64 each.
+        domains_b: a list of the domains that neighbor the known domain.
+        lengths_b: the amount of live domain values in each domain of domains_b.
+        dirty_b: a boolean array of queued domains in domains_b.
+        index: the index of the known domain from the list of domains that it came from.
+        known_intersects: the bitmap of known intersections of the known domain.
+        known_false: the board bitmap of cells known to be empty.
+        is_rows: whether the known domain is a row or a column.
+        queue: the queue of lines to search.
+        state: the head and size of queue.
+        N: the number of rows/columns.
+    """
+    known_value = domain[0]
+    for i in range(N):
+        if (known_value >> np.uint64(i)) & np.uint64(1) or \
+                _mark_cell_64(known_false, index, i, is_rows) or lengths_b[i] <= 1 or \
+                (known_intersects >> np.uint64(i)) & np.uint64(1):
+            continue
+        length = _reduce_domain_64(domains_b[i], lengths_b[i], index, 0)
+        if length != lengths_b[i]:
+            lengths_b[i] = length
+            _push_dirty(dirty_b, i, queue, state, i + N if is_rows else i)
+
+
+@njit(cache=True, boundscheck=False)
+def _reduce_domain_64(domain, length, index, value):
+    """Single-word version of _reduce_domain for rows/columns of at most 64 cells.
+
+    Args:
+        domain: the domain values, one uint64 each.
+        length: the amount of live domain values in domain.
+        index: the index of the known value.
+        value: the value of the known index.
+
+    Returns:
+        The new amount of live domain values in domain.
+    """
+    if length == 1:
+        return length
+    mask = np.uint64(1) << np.uint64(index)
+    want = mask if value else np.uint64(0)
+    for j in range(length - 1, -1, -1):
+        if (domain[j] & mask) != want:
+            length = _remove_idx_64(domain, length, j)
+    return length
+
+
+@njit(cache=True, boundscheck=False)
+def _get_domain_intersects_64(domain, length, known_intersects, full_mask, N):
+    """Single-word version of _get_domain_intersects for rows/columns of at most 64 cells.
+
+    Args:
+        domain: the domain values, one uint64 each.
+        length: the amount of live domain values in domain.
+        known_intersects: the bitmap of known intersections of domain.
+        full_mask: a bitmask with a bit set for every cell in a row/column.
+        N: the number of rows/columns.
+
+    Returns:
+        An array of the indexes of the intersections and an array of their values.
+    """
+    all_true = all_false = full_mask & ~known_intersects
+    for j in range(length):
+        all_true &= domain[j]
+        all_false &= ~domain[j]
+    cols = np.empty(N, dtype=np.int64)
+    values = np.empty(N, dtype=np.uint64)
+    count = 0
+    for word, value in ((all_true, 1), (all_false, 0)):
+        while word:
+            bit = word & (~word + np.uint64(1))
+            cols[count] = DEBRUIJN_INDEX[(bit * DEBRUIJN_64) >> np.uint64(58)]
+            values[count] = value
+            count += 1
+            word &= word - np.uint64(1)
+    return cols[:count], values[:count]
+
+
+def _mark_cell_any(board, index, i, is_rows):
+    """Runs _mark_cell, or _mark_cell_64 when board has one uint64 per row."""
+
+
+@overload(_mark_cell_any)
+def _mark_cell_any_impl(board, index, i, is_rows):
+    def impl(board, index, i, is_rows):
+        return _mark_cell(board, index, i, is_rows)
+
+    def impl_64(board, index, i, is_rows):
+        return _mark_cell_64(board, index, i, is_rows)
+    return impl if board.ndim == 2 else impl_64
+
+
+def _reduce_domain_any(domain, length, index, value):
+    """Runs _reduce_domain, or _reduce_domain_64 when domain has one uint64 per domain value."""
+
+
+@overload(_reduce_domain_any)
+def _reduce_domain_any_impl(domain, length, index, value):
+    def impl(domain, length, index, value):
+        return _reduce_domain(domain, length, index, value)
+
+    def impl_64(domain, length, index, value):
+        return _reduce_domain_64(domain, length, index, value)
+    return impl if domain.ndim == 2 else impl_64
+
+
+def _get_domain_intersects_any(domain, length, known_intersects, full_mask, N, W):
+    """Runs _get_domain_intersects, or _get_domain_intersects_64 when domain has one uint64 per domain value."""
+
+
+@overload(_get_domain_intersects_any)
+def _get_domain_intersects_any_impl(domain, length, known_intersects, full_mask, N, W):
+    def impl(domain, length, known_intersects, full_mask, N, W):
+        return _get_domain_intersects(domain, length, known_intersects, full_mask, N, W)
+
+    def impl_64(domain, length, known_intersects, full_mask, N, W):
+        return _get_domain_intersects_64(domain, length, known_intersects, full_mask, N)
+    return impl if domain.ndim == 2 else impl_64
+
+
+def _reduce_neighbor_domains_any(domain, domains_b, lengths_b, dirty_b, index, known_intersects,
+                                 known_false, is_rows, queue, state, N):
+    """Runs _reduce_neighbor_domains, or _reduce_neighbor_domains_64 when domain has one uint64 per domain value."""
+
+
+@overload(_reduce_neighbor_domains_any)
+def _reduce_neighbor_domains_any_impl(domain, domains_b, lengths_b, dirty_b, index, known_intersects,
+                                      known_false, is_rows, queue, state, N):
+    def impl(domain, domains_b, lengths_b, dirty_b, index, known_intersects,
+             known_false, is_rows, queue, state, N):
+        _reduce_neighbor_domains(domain, domains_b, lengths_b, dirty_b, index, known_intersects,
+                                 known_false, is_rows, queue, state, N)
+
+    def impl_64(domain, domains_b, lengths_b, dirty_b, index, known_intersects,
+                known_false, is_rows, queue, state, N):
+        _reduce_neighbor_domains_64(domain, domains_b, lengths_b, dirty_b, index, known_intersects,
+                                    known_false, is_rows, queue, state, N)
+    return impl if domain.ndim == 2 else impl_64
+
+
+@njit(cache=True, boundscheck=False)
+def _reduce_one(i, domains_a, lengths_a, known_a, domains_b, lengths_b, dirty_b,
+                known_intersects, known_true, known_false, is_rows, full_mask, queue, state, N, W):
+    """Searches one domain and reduces its neighboring domains.
+
+    Intersections that are already marked on the board have already been
+    applied to domains_b, and every domain in domains_b that loses domain
+    values is queued to be searched.
+
+    Args:
+        i: the index of the domain to search in domains_a.
+        domains_a: a list of the packed domains to search through.
+        lengths_a: the amount of live domain values in each domain of domains_a.
+        known_a: a boolean array of known domains for domains_a.
+        domains_b: a list of the packed domains neighboring domains_a.
+        lengths_b: the amount of live domain values in each domain of domains_b.
+        dirty_b: a boolean array of queued domains in domains_b.
+        known_intersects: a bitmap of known intersections for domains_a.
+        known_true: the board bitmap of cells known to be filled.
+        known_false: the board bitmap of cells known to be empty.
+        is_rows: whether domains_a are rows or columns.
+        full_mask: a bitmask with a bit set for every cell in a row/column.
+        queue: the queue of lines to search.
+        state: the head and size of queue.
+        N: the number of rows/columns.
+        W: the number of uint64 words per domain value.
+
+    Returns:
+        Whether the domain became known.
+    """
+    became_known = False
+    if lengths_a[i] == 1:
+        _reduce_neighbor_domains_any(
+            domains_a[i], domains_b, lengths_b, dirty_b, i, known_intersects[i],
+            known_false, is_rows, queue, state, N)
+        known_a[i] = became_known = True
+
+    cols, values = _get_domain_intersects_any(
+        domains_a[i], lengths_a[i], known_intersects[i], full_mask, N, W)
+    for c, value in zip(cols, values):
+        if not _mark_cell_any(known_true if value else known_false, i, c, is_rows):
+            length = _reduce_domain_any(domains_b[c], lengths_b[c], i, value)
+            if length != lengths_b[c]:
+                lengths_b[c] = length
+                _push_dirty(dirty_b, c, queue, state, c + N if is_rows else c)
+        _mark_cell_any(known_intersects, i, c, True)
+    return became_known
+
+
+@njit(cache=True, boundscheck=False)
+def _reduce_worklist(row_domains, row_lengths, known_rows, row_dirty,
+                     col_domains, col_lengths, known_cols, col_dirty,
+                     known_intersect_rows, known_intersect_cols, known_true, known_false,
+                     full_mask, N, W):
+    """Reduces the row and column domains until none of them change.
+
+    Every dirty row and column is queued, and lines are searched one at
+    a time until the queue is empty or every row or column is known.
+    A line is only queued again when one of its domain values is removed.
+    When the domains and boards are given without their words axis, the
+    single-word kernels are used instead.
+
+    Args:
+        row_domains: a list of the packed row domains.
+        row_lengths: the amount of live domain values in each row domain.
+        known_rows: a boolean array of known rows.
+        row_dirty: a boolean array of rows to search.
+        col_domains: a list of the packed column domains.
+        col_lengths: the amount of live domain values in each column domain.
+        known_cols: a boolean array of known columns.
+        col_dirty: a boolean array of columns to search.
+        known_intersect_rows: a bitmap of known intersections found while searching rows.
+        known_intersect_cols: a bitmap of known intersections found while searching columns.
+        known_true: the board bitmap of cells known to be filled.
+        known_false: the board bitmap of cells known to be empty.
+        full_mask: a bitmask with a bit set for every cell in a row/column.
+        N: the number of rows/columns.
+        W: the number of uint64 words per domain value.
+    """
+    queue = np.empty(2 * N, dtype=np.int64)
+    state = np.zeros(2, dtype=np.int64)
+    for i in range(N):
+        if row_dirty[i]:
+            row_dirty[i] = False
+            _push_dirty(row_dirty, i, queue, state, i)
+    for i in range(N):
+        if col_dirty[i]:
+            col_dirty[i] = False
+            _push_dirty(col_dirty, i, queue, state, i + N)
+
+    known_row_count, known_col_count = known_rows.sum(), known_cols.sum()
+    while state[1] > 0 and known_row_count < N and known_col_count < N:
+        line = _pop_line(queue, state)
+        if line < N:
+            row_dirty[line] = False
+            if not known_rows[line] and _reduce_one(
+                    line, row_domains, row_lengths, known_rows, col_domains, col_lengths, col_dirty,
+                    known_intersect_rows, known_true, known_false, True, full_mask, queue, state, N, W):
+                known_row_count += 1
+        else:
+            line -= N
+            col_dirty[line] = False
+            if not known_cols[line] and _reduce_one(
+                    line, col_domains, col_lengths, known_cols, row_domains, row_lengths, row_dirty,
+                    known_intersect_cols, known_true, known_false, False, full_mask, queue, state, N, W):
+                known_col_count += 1
 
 
 class NonogramSolver:
     """Nonogram solving class
 
     Attributes:
-        row_domains: A list of all domain values for rows.
-        col_domains: A list of all domain values for columns.
-        known_rows: A set of indexes of known rows.
-        known_cols: A set of indexes of known columns.
-        known_intersects: A set of tuples of known intersections.
+        row_domains: A list of all domains for rows.
+        col_domains: A list of all domains for columns.
+            Each domain is its own array of shape (words, domain values) where
+            each domain value is a bitmask of filled cells packed into uint64
+            words, so the same word of every domain value is contiguous.
+        row_lengths: The amount of live domain values in each row domain.
+        col_lengths: The amount of live domain values in each column domain.
+        known_rows: A boolean array of known rows.
+        known_cols: A boolean array of known columns.
+        row_deferred: A boolean array of rows whose domains have not been generated yet.
+        col_deferred: A boolean array of columns whose domains have not been generated yet.
+        known_true: A (rows, words) bitmap of cells known to be filled.
+        known_false: A (rows, words) bitmap of cells known to be empty.
+        row_dirty: A boolean array of rows that have lost domain values since they were last searched.
+        col_dirty: A boolean array of columns that have lost domain values since they were last searched.
+        known_intersect_rows: A bitmap of known intersections found while searching rows.
+        known_intersect_cols: A bitmap of known intersections found while searching columns.
         size: The number of rows/columns.
         rows: A list of arrays of row values.
         cols: A list of array of column values.
-        is_searching_rows: A boolean indicating if the solver is currently searching rows or columns.
+        words: The number of uint64 words needed to hold one row/column.
+        full_mask: A bitmask with a bit set for every cell in a row/column.
+        run_mask: A table where run_mask[k][i] is the bitmask of k filled cells starting at index i.
     """
 
     def __init__(self, filename) -> None:
-        """Inits Nonogram solver with size, rows, and columns, and is_searching_rows to True."""
-        self.row_domains, self.col_domains = list(), list()
-        self.known_rows, self.known_cols, self.known_intersects = set(), set(), set()
+        """Inits Nonogram solver with size, rows, and columns."""
         self.size, self.rows, self.cols = self.read_file(filename)
-        self.is_searching_rows = True
+        self.row_domains = self.col_domains = None
+        self.row_lengths = self.col_lengths = None
+        self.row_deferred = self.col_deferred = None
+        self.known_rows = np.full(self.size, False)
+        self.known_cols = np.full(self.size, False)
+        self.row_dirty = np.full(self.size, True)
+        self.col_dirty = np.full(self.size, True)
+        self.words = (self.size + 63) // 64
+        self.known_intersect_rows = np.zeros((self.size, self.words), dtype=np.uint64)
+        self.known_intersect_cols = np.zeros((self.size, self.words), dtype=np.uint64)
+        self.known_true = np.zeros((self.size, self.words), dtype=np.uint64)
+        self.known_false = np.zeros((self.size, self.words), dtype=np.uint64)
+        self.run_mask = run_mask_table(self.size)
+        self.full_mask = self.run_mask[self.size, 0].copy()
 
-    def generateDomainHelper(self, nums, domain, row, last_start, last_num, index, sum):
-        """Recursively generates domain values for nums
+    def getBit(self, value, index):
+        """Returns the value of the cell at index within a packed domain value."""
+        return bool((int(value[index >> 6]) >> (index & 63)) & 1)
 
-        Args:
-            nums: list of all cell groups.
-            domain: list of all possible domain values for the given row/column.
-            row: domain value for nums.
-            last_start: the starting index of the last group of cells.
-            last_num: the amount of cells in the last group of cells.
-            index: the index of the current number in nums.
-            sum: the sum of the numbers left to process in nums.
+    def getSlack(self, nums):
+        """Returns the amount of empty cells that can move between the cell groups in nums."""
+        return self.size - sum(nums) - max(len(nums) - 1, 0)
 
-        Returns:
-            A list of arrays that represent the possible domain values for nums.
-        """
-        if sum == 0:
-            return domain.append(row)
-        sum -= nums[index]
-
-        # Calculate the first index that the number could start with
-        start = 0 if last_start == -1 else last_start + last_num + 1
-
-        # Calculate the last index that the number could start with
-        end = self.size - sum - len(nums) + index - nums[index] + 2
-        if start == end:
-            end += 1
-
-        # Create all possible row configurations given the current number
-        # and the range of valid cells that it can possess, then recurse
-        for i in range(start, end):
-            row_copy = row.copy()
-            for j in range(nums[index]):
-                row_copy[i + j] = True
-            self.generateDomainHelper(nums, domain, row_copy,
-                                      i, nums[index], index + 1, sum)
-
-    def generateDomain(self, nums):
-        """Generates domain values for nums.
+    def generateDomains(self, lines):
+        """Generates the domains of a list of rows/columns.
+
+        Rows/columns with more than MAX_DOMAIN_VALUES domain values are
+        deferred and left empty until generateDeferredDomains is called.
 
         Args:
-            nums: list of all cell groups.
+            lines: a list of the cell groups of each row/column.
 
         Returns:
-            A list of arrays that represent the possible domain values for nums.
+            A list of arrays of shape (words, domain values), an array of the
+            amount of domain values in each domain and a boolean array of
+            deferred domains.
         """
-        domain = list()
-        self.generateDomainHelper(nums, domain, np.full(
-            self.size, False), -1, -1, 0, np.sum(nums))
-        return domain
+        clue_offsets = np.cumsum([0] + [len(nums) for nums in lines], dtype=np.int64)
+        clue_values = np.array([k for nums in lines for k in nums], dtype=np.int64)
+        slacks = np.array([self.getSlack(nums) for nums in lines], dtype=np.int64)
+        counts = [comb(slack + len(nums), len(nums)) for slack, nums in zip(slacks, lines)]
+        deferred = np.array([count > MAX_DOMAIN_VALUES for count in counts])
+        counts = np.array([0 if count > MAX_DOMAIN_VALUES else count for count in counts],
+                          dtype=np.int64)
+        value_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        packed = _build_all_domains(clue_offsets, clue_values, value_offsets, slacks, counts,
+                                    self.run_mask, self.words)
+        return _split_domains(packed, value_offsets, self.words), counts, deferred
 
-    def reduceNeighborDomains(self, known_domain, unknown_domains, index):
-        """Reduces a list of domains given a known neighboring domain.
-
-        Args:
-            known_domain: a domain that is known and neighbors all domains in unknown_domains.
-            unknown_domains: a list of unknown domains that neighbors known_domain.
-            index: the index of known_domain from the list of domains that it came from.
-        """
-        for i, value in enumerate(known_domain):
-            if not value and len(unknown_domains[i]) > 1 and (self.is_searching_rows, index, i) not in self.known_intersects:
-                for j, domain in reversed(list(enumerate(unknown_domains[i]))):
-                    if domain[index]:
-                        del unknown_domains[i][j]
+    def applyOverlaps(self, lines, deferred, is_rows):
+        """Marks the cells that every domain value of a deferred row/column fills.
 
-    def reduceDomain(self, domain, index, value):
-        """Reduces a domain given a known index and value within that domain.
-
-        From the domain values in domain, removes all domain values whose value
-        at index is not equal to value.
+        A cell group longer than the slack always covers its last cells
+        that are past the slack, wherever the group is placed, so those
+        cells are marked as filled and the crossing domains are reduced.
 
         Args:
-            domain: a list of domain values.
-            index: the index of the known value.
-            value: the value of the known index.
+            lines: a list of the cell groups of each row/column.
+            deferred: a boolean array of deferred domains for lines.
+            is_rows: whether lines are rows or columns.
         """
-        if len(domain) == 1:
-            return
-        for i in reversed(range(len(domain))):
-            if domain[i][index] != value:
-                del domain[i]
+        for i in np.flatnonzero(deferred):
+            slack, pos = self.getSlack(lines[i]), 0
+            for k in lines[i]:
+                for c in range(pos + slack, pos + k):
+                    self.markCell(i, c, True, is_rows)
+                pos += k + 1
 
-    def getDomainIntersects(self, domain, index):
-        """Returns a list of intersections/known values within a domain.
+    def markCell(self, index, i, value, is_rows):
+        """Marks a cell of a row/column as known and reduces the crossing domain.
 
         Args:
-            domain: the domain to search through.
-            index: the index of domain from the list of domains that it came from.
+            index: the index of the row/column.
+            i: the index of the cell within that row/column.
+            value: whether the cell is filled.
+            is_rows: whether index is a row or a column.
 
         Returns:
-            A list of tuples where each tuple contains the index and value
-            of a known index and value in domain.
+            Whether the cell was not marked already.
         """
-        intersects = list()
-        for i in range(len(domain[0])):
-            if (self.is_searching_rows, index, i) not in self.known_intersects:
-                all_true = all_false = True
-                for j in domain:
-                    if not all_true and not all_false:
-                        break
-                    if not j[i]:
-                        all_true = False
-                    else:
-                        all_false = False
-                if all_true:
-                    intersects.append((i, True))
-                if all_false:
-                    intersects.append((i, False))
-        return intersects
-
-    def reduceDomains(self, domains_a, known_domains_a, domains_b):
-        """Reduces a domain given the domain's neighboring domains.
+        domains_b, lengths_b, dirty_b = (self.col_domains, self.col_lengths, self.col_dirty) \
+            if is_rows else (self.row_domains, self.row_lengths, self.row_dirty)
+        if _mark_cell(self.known_true if value else self.known_false, index, i, is_rows):
+            return False
+        length = _reduce_domain(_get_domain(domains_b, i), lengths_b[i], index, value)
+        if length != lengths_b[i]:
+            lengths_b[i], dirty_b[i] = length, True
+        return True
 
-        Args:
-            domains_a: a list of domain values
-            known_domains_a: a list of known domains for domains_a
-            domains_b: a list of domain values
+    def getKnownLine(self, index, is_rows):
+        """Returns boolean arrays of the known filled and empty cells of a row/column."""
+        if is_rows:
+            cells = np.arange(self.size)
+            shifts = (cells & 63).astype(np.uint64)
+            return tuple(((board[index, cells >> 6] >> shifts) & np.uint64(1)).astype(bool)
+                         for board in (self.known_true, self.known_false))
+        return tuple(((board[:, index >> 6] >> np.uint64(index & 63)) & np.uint64(1)).astype(bool)
+                     for board in (self.known_true, self.known_false))
+
+    def generateDeferredDomains(self):
+        """Reduces the deferred rows/columns against the cells known so far.
+
+        Every deferred row/column with at most MAX_DOMAIN_VALUES domain values
+        left is generated, and gets an array of its own size. The others stay
+        deferred, but the cells that agree in all of their domain values are
+        marked and the crossing domains are reduced.
+
+        Returns:
+            Whether any domain was generated or any cell was marked.
         """
-        for i, domain in enumerate(domains_a):
-            if i not in known_domains_a:
-                if len(domain) == 1:
-                    self.reduceNeighborDomains(domain[0], domains_b, i)
-                    known_domains_a.add(i)
-
-                intersects = self.getDomainIntersects(domain, i)
-                for intersect in intersects:
-                    self.reduceDomain(
-                        domains_b[intersect[0]], i, intersect[1])
-                    self.known_intersects.add(
-                        (self.is_searching_rows, i, intersect[0]))
+        changed = False
+        for is_rows, lines, deferred in ((True, self.rows, self.row_deferred),
+                                         (False, self.cols, self.col_deferred)):
+            domains, lengths, dirty = (self.row_domains, self.row_lengths, self.row_dirty) \
+                if is_rows else (self.col_domains, self.col_lengths, self.col_dirty)
+            for i in np.flatnonzero(deferred):
+                nums = np.array(lines[i], dtype=np.int64)
+                filled, empty = self.getKnownLine(i, is_rows)
+                ways = _count_known_lines(nums, filled, empty, 1 << 62)
+                count = ways[0, 0]
+                if count == 0:
+                    continue
+                if count <= MAX_DOMAIN_VALUES:
+                    domain = np.zeros((self.words, count), dtype=np.uint64)
+                    lengths[i] = _enumerate_known_lines(
+                        domain, nums, self.run_mask, filled, empty, ways, self.words)
+                    _set_domain(domains, i, domain)
+                    deferred[i], dirty[i], changed = False, True, True
+                    continue
+                forced_filled, forced_empty = _find_forced_cells(nums, filled, empty, ways)
+                for c in np.flatnonzero(forced_filled & ~filled):
+                    changed |= self.markCell(i, c, True, is_rows)
+                for c in np.flatnonzero(forced_empty & ~empty):
+                    changed |= self.markCell(i, c, False, is_rows)
+        return changed
 
     def solve(self):
         """Solves a nonogram.
@@ -177,20 +969,46 @@ class NonogramSolver:
         intersections/known values in a row or column domain and
         removing neighboring domains who do not possess the known value.
         """
-        for row in self.rows:
-            self.row_domains.append(self.generateDomain(row))
-        for col in self.cols:
-            self.col_domains.append(self.generateDomain(col))
-
-        while len(self.known_rows) != self.size and len(self.known_cols) != self.size:
-            self.reduceDomains(
-                self.row_domains, self.known_rows, self.col_domains)
-            self.is_searching_rows = not self.is_searching_rows
-            if len(self.known_rows) != self.size:
-                self.reduceDomains(
-                    self.col_domains, self.known_cols, self.row_domains)
-                self.is_searching_rows = not self.is_searching_rows
-        return
+        self.row_domains, self.row_lengths, self.row_deferred = self.generateDomains(self.rows)
+        self.col_domains, self.col_lengths, self.col_deferred = self.generateDomains(self.cols)
+        self.row_dirty &= ~self.row_deferred
+        self.col_dirty &= ~self.col_deferred
+        self.applyOverlaps(self.rows, self.row_deferred, True)
+        self.applyOverlaps(self.cols, self.col_deferred, False)
+
+        reduceAllDomains = self.reduceAllDomains64 if self.words == 1 else self.reduceAllDomains
+        reduceAllDomains()
+        while not self.known_rows.all() and not self.known_cols.all() and \
+                self.generateDeferredDomains():
+            reduceAllDomains()
+
+    def reduceAllDomains(self):
+        """Reduces the row and column domains until none of them change."""
+        _reduce_worklist(self.row_domains, self.row_lengths, self.known_rows, self.row_dirty,
+                         self.col_domains, self.col_lengths, self.known_cols, self.col_dirty,
+                         self.known_intersect_rows, self.known_intersect_cols,
+                         self.known_true, self.known_false, self.full_mask, self.size, self.words)
+
+    def reduceAllDomains64(self):
+        """Reduces the domains of a nonogram with at most 64 rows/columns.
+
+        Every domain value fits in a single uint64, so the worklist is run
+        on views that drop the words axis, which picks the single-word kernels.
+        """
+        _reduce_worklist(_drop_words(self.row_domains), self.row_lengths,
+                         self.known_rows, self.row_dirty,
+                         _drop_words(self.col_domains), self.col_lengths,
+                         self.known_cols, self.col_dirty,
+                         self.known_intersect_rows[:, 0], self.known_intersect_cols[:, 0],
+                         self.known_true[:, 0], self.known_false[:, 0], self.full_mask[0], self.size, 1)
+
+    def read_line(self, line):
+        """Parses one line of a nonogram file.
+
+        Tuples are read as lists, and trailing commas such as the one in
+        (1,) are dropped, since JSON does not allow them.
+        """
+        return json.loads(re.sub(r',\s*([\]\)])', r'\1', line).replace('(', '[').replace(')', ']'))
 
     def read_file(self, filename):
         """Reads a nonogram file.
@@ -203,7 +1021,7 @@ class NonogramSolver:
         """
         try:
             with open(filename, 'r') as f:
-                return literal_eval(f.readline()), literal_eval(f.readline()), literal_eval(f.readline())
+                return self.read_line(f.readline()), self.read_line(f.readline()), self.read_line(f.readline())
         except IOError as e:
             print("Cannot open file " + str(filename) + ".")
             sys.exit()
@@ -216,17 +1034,17 @@ class NonogramSolver:
         """
         solved_domains = None
         rows = False
-        if len(self.known_rows) == self.size:
+        if self.known_rows.all():
             solved_domains = self.row_domains
             rows = True
-        elif len(self.known_cols) == self.size:
+        elif self.known_cols.all():
             solved_domains = self.col_domains
         else:
             return print("Solve the puzzle first!")
 
-        for i in range(len(solved_domains)):
-            for j in range(len(solved_domains)):
-                if (rows and solved_domains[i][0][j]) or (not rows and solved_domains[j][0][i]):
+        for i in range(self.size):
+            for j in range(self.size):
+                if (rows and self.getBit(_get_domain(solved_domains, i)[:, 0], j)) or (not rows and self.getBit(_get_domain(solved_domains, j)[:, 0], i)):
                     print('▯', end='')
                 else:
                     print('▮', end='')
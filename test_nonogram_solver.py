@@ -0,0 +1,117 @@
+import contextlib
+import glob
+import io
+import itertools
+import os
+import random
+import unittest
+from math import comb
+from unittest import mock
+
+import numpy as np
+
+from nonogram_solver import NonogramSolver, _count_known_lines, _enumerate_known_lines, \
+    _find_forced_cells, run_mask_table
+
+TEST_INPUTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test-inputs')
+
+
+def clues(cells):
+    return [len(list(group)) for filled, group in itertools.groupby(cells) if filled]
+
+
+class CountKnownLinesTest(unittest.TestCase):
+
+    def count(self, nums, size, limit):
+        unknown = np.full(size, False)
+        return _count_known_lines(np.array(nums, dtype=np.int64), unknown, unknown, limit)[0, 0]
+
+    def test_matches_comb_when_nothing_is_known(self):
+        for size, nums in ((5, [2, 1]), (10, [1, 1, 1]), (25, [3, 1, 4, 1, 5]), (40, [1] * 10)):
+            slack = size - sum(nums) - (len(nums) - 1)
+            self.assertEqual(self.count(nums, size, 1 << 62), comb(slack + len(nums), len(nums)))
+
+    def test_saturates_without_overflow(self):
+        for size, nums in ((100, [1] * 30), (107, [1] * 20), (64, [1] * 16)):
+            slack = size - sum(nums) - (len(nums) - 1)
+            for limit in (1 << 62, np.iinfo(np.int64).max, 1000):
+                self.assertEqual(self.count(nums, size, limit),
+                                 min(comb(slack + len(nums), len(nums)), limit))
+
+
+class KnownLinesTest(unittest.TestCase):
+
+    def test_matches_brute_force(self):
+        rng = random.Random(0)
+        for _ in range(500):
+            size = rng.randint(1, 10)
+            nums = clues([rng.random() < 0.6 for _ in range(size)])
+            filled = np.array([rng.random() < 0.15 for _ in range(size)])
+            empty = np.array([not f and rng.random() < 0.15 for f in filled])
+            expected = {sum(1 << c for c in range(size) if cells[c])
+                        for cells in itertools.product((False, True), repeat=size)
+                        if clues(cells) == nums and not any(np.array(cells) & empty)
+                        and not any(~np.array(cells) & filled)}
+
+            ways = _count_known_lines(np.array(nums, dtype=np.int64), filled, empty, 1 << 62)
+            self.assertEqual(ways[0, 0], len(expected))
+            out = np.zeros((1, max(len(expected), 1)), dtype=np.uint64)
+            count = _enumerate_known_lines(out, np.array(nums, dtype=np.int64), run_mask_table(size),
+                                           filled, empty, ways, 1)
+            self.assertEqual(count, len(expected))
+            self.assertEqual({int(value) for value in out[0, :count]}, expected)
+            if not expected:
+                continue
+
+            forced_filled, forced_empty = _find_forced_cells(
+                np.array(nums, dtype=np.int64), filled, empty, ways)
+            for c in range(size):
+                bits = {(value >> c) & 1 for value in expected}
+                self.assertEqual(forced_filled[c], bits == {1})
+                self.assertEqual(forced_empty[c], bits == {0})
+
+
+class DeferredDomainsTest(unittest.TestCase):
+
+    def solve(self, filename):
+        solver = NonogramSolver(filename)
+        solver.solve()
+        board = io.StringIO()
+        with contextlib.redirect_stdout(board):
+            solver.print_board()
+        return board.getvalue()
+
+    def test_deferring_every_line_gives_the_same_board(self):
+        for filename in sorted(glob.glob(os.path.join(TEST_INPUTS, '*.txt'))):
+            expected = self.solve(filename)
+            self.assertNotIn('Solve the puzzle first!', expected)
+            for cap in (1, 3):
+                with mock.patch('nonogram_solver.MAX_DOMAIN_VALUES', cap):
+                    self.assertEqual(self.solve(filename), expected, (filename, cap))
+
+
+class RunMaskTableTest(unittest.TestCase):
+
+    def test_shared_table_is_read_only(self):
+        self.assertIs(run_mask_table(7), run_mask_table(7))
+        with self.assertRaises(ValueError):
+            run_mask_table(7)[1, 0, 0] = 0
+
+
+class ReadLineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.solver = NonogramSolver.__new__(NonogramSolver)
+
+    def test_reads_lists_and_tuples(self):
+        self.assertEqual(self.solver.read_line('25\n'), 25)
+        self.assertEqual(self.solver.read_line('[[1, 2], [3]]\n'), [[1, 2], [3]])
+        self.assertEqual(self.solver.read_line('[(1, 2), (3,)]\n'), [[1, 2], [3]])
+
+    def test_drops_trailing_commas(self):
+        self.assertEqual(self.solver.read_line('[[1, 2,], [3,] ,]\n'), [[1, 2], [3]])
+        self.assertEqual(self.solver.read_line('((1,), (2, 3 , ), )\n'), [[1], [2, 3]])
+
+
+if __name__ == '__main__':
+    unittest.main()